@@ -1,18 +1,103 @@
-import numpy   as _n
-import time    as _time
-import spinmob as _s
+import os          as _os
+import re          as _re
+import sys         as _sys
+import collections as _collections
+import numpy     as _n
+import time      as _time
+import queue     as _queue
+import threading as _threading
+import spinmob   as _s
 import spinmob.egg as _egg
 _g = _egg.gui
 import mcphysics as _mp
 
 
-_debug_enabled = True
+_debug_enabled = False
 _debug = _mp._debug
 _p = _mp._p
 
-# Serial COM markers
-endMarker   = '\n'
-terminator  = '\r\n'
+# Serial COM markers (and their bytes forms, encoded once rather than on
+# every transaction)
+endMarker     = '\n'
+terminator    = '\r\n'
+_END_MARKER_B = endMarker.encode()
+_TERMINATOR_B = terminator.encode()
+
+# Minimum time between plot redraws during acquisition (s). Repainting the
+# Qt plots is far more expensive than collecting the data itself.
+_PLOT_INTERVAL = 0.1
+
+# Matches one floating-point reading in a raw instrument reply
+_FLOAT_RE = _re.compile(rb'[-+]?\d+\.\d+(?:[eE][-+]?\d+)?')
+
+# As above, but the decimal part is optional (the Arduino sends bare ints)
+_NUM_RE   = _re.compile(rb'[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?')
+
+# Keithley 199 machine-status codes -> display strings
+_FUNC_MAP  = ('DC VOLTS','AC VOLTS','OHMS','DC CURRENT','AC CURRENT','ACV dB','ACA dB')
+_RANGE_MAP = ('AUTO','300 mV','3 V','30 V','300V','300V','300V','300V')
+_RATE_MAP  = ('4 1/2 Digits','5 1/2 Digits')
+
+# Decoded Keithley 199 machine-status word (see _parse_mstatus)
+_KMachineStatus = _collections.namedtuple('_KMachineStatus', ['ID','M','F','R','S'])
+
+def _parse_mstatus(s):
+    """
+    Parses the Keithley 199 machine-status string into its typed fields:
+    model ID, multiplex flag, and function / range / rate codes.
+    """
+    return _KMachineStatus(s[:3], s[3] != '0', int(s[5]), int(s[21]), int(s[22]))
+
+# Cached hardware enumeration results. Probing VISA resources costs one RPC
+# per resource and COM-port listing can take hundreds of ms on Windows, so
+# we only do each once per session.
+_visa_name_cache = {}
+_comport_cache   = None
+
+
+def _list_visa_names(resource_manager):
+    """
+    Returns the list of VISA resource aliases (or raw addresses when there is
+    no alias) for the supplied resource manager, caching the result so that
+    rebuilding the GUI does not re-probe the hardware.
+    """
+    names = _visa_name_cache.get(id(resource_manager))
+    if names == None:
+        names = []
+        for x in resource_manager.list_resources():
+            # One resource_info round trip per resource, falling back to
+            # the raw address if the query fails (e.g. a wedged device)
+            try:
+                info = resource_manager.resource_info(x)
+                names.append(str(info.alias) if info.alias else x)
+            except:
+                names.append(x)
+        _visa_name_cache[id(resource_manager)] = names
+    return names
+
+def _list_comports():
+    """
+    Returns (ports, arduino_index), where ports is a list of "PORT: DESC"
+    strings and arduino_index is the position of the first port describing
+    itself as an Arduino. The result is cached for the session.
+    """
+    global _comport_cache
+    if _comport_cache == None:
+
+        # Sort on the port name only; comparing the whole tuples drags the
+        # descriptions into every comparison (and breaks on None fields).
+        comports = list(_mp._serial.tools.list_ports.comports())
+        comports.sort(key=lambda c: c.device)
+
+        ports   = []
+        d_index = 0
+        for i, c in enumerate(comports):
+            ports.append("{}: {}".format(c.device, c.description))
+
+            # Check for Arduino label in the port name
+            if 'Arduino' in c.description: d_index = i
+        _comport_cache = (ports, d_index)
+    return _comport_cache
 
 
 class keithley_dmm_api():
@@ -57,10 +142,32 @@ class keithley_dmm_api():
         # Get time t=t0
         self._t0 = _time.time()
 
+        # Channel-select commands, built once instead of per sample
+        self._channel_cmds = ['F0R0N%dX' % (n+1) for n in range(8)]
+
+        # Overall deadline for the cooperative poll loop in read() (s)
+        self._read_timeout = 5
+
+        # Cleared the first time the unit rejects the scanner framing, so
+        # get_voltages() stops re-trying (and re-failing) it every sweep.
+        # Repeated timeouts count as rejection too (see _disable_scan()).
+        self._scan_ok       = True
+        self._scan_timeouts = 0
+
         # Try to open the instrument.
         try:
             self.instrument = self.resource_manager.open_resource(name)
 
+            # Short VISA timeout so read() can poll cooperatively instead of
+            # blocking the GUI thread for seconds (see read()).
+            self.instrument.timeout = 50
+
+            # Pre-encode the fixed commands used on the hot path, so each
+            # sample skips the str concat + encode pyvisa does per write().
+            term = self.instrument.write_termination or ''
+            self._CMD_READ         = ('++read 10' + term).encode()
+            self._channel_cmds_raw = [(c + term).encode() for c in self._channel_cmds]
+
             # Test that it's responding and figure out the type.
             try:
                 # Clear out the buffer, in case the instrument was
@@ -102,7 +209,7 @@ class keithley_dmm_api():
             Optional function to be called in between communications, e.g., to
             update a gui.
         """
-        _debug('write('+"'"+message+"'"+')')
+        if _debug_enabled: _debug('write('+"'"+message+"'"+')')
 
         if self.instrument == None: s = None
         else:                       s = self.instrument.write(message)
@@ -110,9 +217,9 @@ class keithley_dmm_api():
         if process_events: process_events()
         return s
 
-    def read(self, process_events=False):
+    def read_raw(self, process_events=False):
         """
-        Reads a message and returns it.
+        Reads a reply and returns it as raw bytes (terminators included).
 
         Parameters
         ----------
@@ -120,24 +227,48 @@ class keithley_dmm_api():
             Optional function to be called in between communications, e.g., to
             update a gui.
         """
-        _debug('read()')
-        self.write('++read 10')
+        if _debug_enabled: _debug('read_raw()')
+        if not self.instrument == None: self.instrument.write_raw(self._CMD_READ)
 
         if process_events: process_events()
 
-        if self.instrument == None: response = ''
-        else:                       response = self.instrument.read()
+        if self.instrument == None: response = b''
+        else:
+            # Cooperative poll: with the short VISA timeout set at connect
+            # time, a slow reply shows up as a stream of timeout errors we
+            # can use to service the GUI, instead of one long blocking call.
+            t_start = _time.time()
+            while True:
+                try:
+                    response = self.instrument.read_raw()
+                    break
+                except _mp._visa.VisaIOError as e:
+                    if not e.error_code == _mp._visa.constants.VI_ERROR_TMO: raise
+                    if _time.time() - t_start > self._read_timeout:        raise
+                    if process_events: process_events()
 
         if process_events: process_events()
 
-        _debug('  '+repr(response))
-        return response.strip()
+        if _debug_enabled: _debug('  '+repr(response))
+        return response
+
+    def read(self, process_events=False):
+        """
+        Reads a message and returns it as a stripped string.
+
+        Parameters
+        ----------
+        process_events=False
+            Optional function to be called in between communications, e.g., to
+            update a gui.
+        """
+        return self.read_raw(process_events).decode().strip()
 
     def query(self, message='U0X', process_events=False):
         """
         Writes the supplied message and reads the response.
         """
-        _debug("query('"+message+"')")
+        if _debug_enabled: _debug("query('"+message+"')")
 
         self.write(message, process_events)
         return self.read(process_events)
@@ -192,29 +323,104 @@ class keithley_dmm_api():
         # Real deal
         elif self.model == 'KEITHLEY199':
 
-            # Select the channel
-            self.write("F0R0N%dX" % channel, process_events)
+            # Select the channel (pre-encoded at connect time)
+            self.instrument.write_raw(self._channel_cmds_raw[channel-1])
+            if process_events: process_events()
 
             # Ask for the voltage & get rid of the garbage
             try:
-                s = self.read(process_events)
+                s = self.read_raw(process_events)
             except:
                 print("ERROR: Timeout on channel "+str(channel))
                 return _time.time() - self._t0, _n.nan
 
-            # Return the voltage
+            # Return the voltage. The regex prevalidates the reading (and
+            # skips the 199's 4-byte mode tag wherever it sits), so float()
+            # can never throw and no exception machinery runs per sample.
+            t = _time.time() - self._t0
+            m = _FLOAT_RE.search(s)
+            if m: return t, float(m.group())
+            print("ERROR: Bad format "+repr(s))
+            return t, _n.nan
+
+
+    def get_voltages(self, channels, process_events=False):
+        """
+        Returns the time just after reading and the list of voltages for the
+        supplied channels, using the 199's internal scanner so the whole
+        sweep costs one read instead of one round-trip per channel. Falls
+        back to per-channel get_voltage() if the reply doesn't parse, and
+        remembers that, so a unit that doesn't speak the scan framing pays
+        for the failed attempt once rather than on every sweep.
+
+        Parameters
+        ----------
+        channels:
+            List of channel numbers to read (integers, 1-8).
+        process_events=False:
+            Optional function that will run whenever possible
+            (e.g., to update a gui).
+        """
+        # Simulation mode
+        if self.instrument == None:
+            _time.sleep(0.4)
+            return _time.time() - self._t0, list(_n.random.rand(len(channels)))
+
+        if self._scan_ok:
+
+            # Program one scanner pass over channels 1..max and trigger it
+            self.write('F0R0Q1N%dT3X' % max(channels), process_events)
+
             try:
-                return _time.time() - self._t0, float(s[4:].strip())
+                s = self.read_raw(process_events)
             except:
-                print("ERROR: Bad format "+repr(s))
-                return _time.time() - self._t0, _n.nan
-
+                # A unit that accepts the framing but never answers is just
+                # as unusable; after a few in a row, stop paying the full
+                # read deadline (and logging an all-NaN row) every sweep.
+                print("ERROR: Timeout on scan")
+                self._scan_timeouts += 1
+                if self._scan_timeouts < 3:
+                    return _time.time() - self._t0, [_n.nan]*len(channels)
+                print("ERROR: %d scan timeouts in a row; reading channels one by one." % self._scan_timeouts)
+                self._disable_scan()
+                s = None
+
+            if not s == None:
+                self._scan_timeouts = 0
+                t = _time.time() - self._t0
+
+                # One reading per scanned channel, in channel order
+                values = [float(m) for m in _FLOAT_RE.findall(s)]
+                if len(values) >= max(channels):
+                    return t, [values[c-1] for c in channels]
+
+                # Framing was off; this unit doesn't do scans, so say so
+                # once and read per-channel from here on.
+                print("ERROR: Bad scan reply "+repr(s)+"; reading channels one by one.")
+                self._disable_scan()
+
+        values = []
+        for c in channels:
+            tc, v = self.get_voltage(c, process_events)
+            values.append(v)
+        return _time.time() - self._t0, values
+
+    def _disable_scan(self):
+        """
+        Gives up on the internal scanner for this session. The failed scan
+        attempt already programmed Q1/T3 into the meter, so put back the
+        single-channel, continuous-trigger setup the per-channel reads
+        (and the front-panel instructions above) rely on.
+        """
+        self._scan_ok = False
+        try:    self.write('F0R0T0N1X')
+        except: print("ERROR: Could not restore trigger setup.")
 
     def close(self):
         """
         Closes the connection to the device.
         """
-        _debug("close()")
+        if _debug_enabled: _debug("close()")
         if not self.instrument == None: self.instrument.close()
 
 
@@ -242,16 +448,26 @@ class Thermocouple_api():
             self.simulation_mode = True
         
         self.simulation_mode = False
-        
+
+        # Raw file descriptor of the port (POSIX only; see _write_bytes)
+        self._fd = None
+
         # If the port is "Simulation"
         if port=='Simulation': self.simulation_mode = True
-        
+
         # If we have all the libraries, try connecting.
         if not self.simulation_mode:
             try:
                 # Create the instrument and ensure the settings are correct.
                 self.serial = _mp._serial.Serial(port = port, baudrate = baudrate, timeout = timeout)
-                
+
+                # On POSIX we can talk to the descriptor directly on the hot
+                # path and skip pyserial's per-call lock. On Windows there
+                # is no usable fileno(), so everything stays on pyserial.
+                if not _sys.platform == 'win32':
+                    try:    self._fd = self.serial.fileno()
+                    except: self._fd = None
+
             # Something went wrong. Go into simulation mode.
             except Exception as e:
                   print('Could not open connection to "'+port+':'+'" at baudrate '+str(baudrate)+'. Entering simulation mode.')
@@ -260,8 +476,21 @@ class Thermocouple_api():
                   self.serial = None
                   return
                 
-        # Container for scan data as it is dynamically acquired          
+        # Container for scan data as it is dynamically acquired
         self.scan_data = ''
+
+        # Get time t=t0 (the interface rebinds this at acquisition start)
+        self._t0 = _time.time()
+
+        # Pre-encoded temperature query for the hot path
+        self._CMD_TEMP = ('THERMO:TEMP?' + endMarker).encode()
+
+        # Persistent receive buffer (see read)
+        self._rx_buf = bytearray()
+
+        # Memoized replies for settings that only change via the setters
+        # below; each refresh otherwise costs a full serial round trip.
+        self._cache = {}
                 
         # Give the arduino time to run the setup loop
         _time.sleep(2)
@@ -279,9 +508,13 @@ class Thermocouple_api():
             A string describing the arduino sketch version and compilation date.
 
         """
+        if 'id' in self._cache: return self._cache['id']
+
         self.write('*IDN?')
-        
-        return self.read()
+
+        v = self.read()
+        if v != '': self._cache['id'] = v
+        return v
     
     def getTemperature(self):
         """
@@ -289,18 +522,28 @@ class Thermocouple_api():
 
         Returns
         -------
+        t: float
+            Time of the reading (s since _t0), stamped as the reply arrives
+            so the timestamp is not skewed by the serial round-trip.
         temp: float
             Thermocouple temperature.
 
         """
-        self.write("THERMO:TEMP?")
-        
-        s = self.read()
-        
-        try:     temp = float(s)
-        except:  temp = s
-        
-        return temp  
+        self._write_bytes(self._CMD_TEMP)
+
+        b = self._read_raw()
+        t = _time.time() - self._t0
+
+        # Parse straight from the bytes; no decode or try/except float()
+        # on the hot path. fullmatch so a fault string that merely contains
+        # a digit (e.g. 'Fault 0x08') can't masquerade as a temperature.
+        if b == None: return t, _n.nan
+        m = _NUM_RE.fullmatch(b.strip())
+        if m: return t, float(m.group())
+
+        # Not a number; fall back to the decoded text (e.g. fault strings)
+        try:    return t, b.decode()
+        except: return t, _n.nan
     
     def setOneshot(self):
         """
@@ -319,24 +562,34 @@ class Thermocouple_api():
         """
         """
         
+        if 'type' in self._cache: return self._cache['type']
+
         self.write('THERMO:TYPE?')
 
-        return self.read()
+        v = self.read()
+        if v != '': self._cache['type'] = v
+        return v
     
     def setThermocoupleType(self, thermocoupleType):
         """
         """
+        self._cache.pop('type', None)
         self.write('THERMO:TYPE '+thermocoupleType)
     
     def getMode(self):
         
+        if 'mode' in self._cache: return self._cache['mode']
+
         self.write("THERMO:MODE?")
-        
-        return self.read()
+
+        v = self.read()
+        if v != '': self._cache['mode'] = v
+        return v
     
     def setMode(self, mode):
         """            
         """
+        self._cache.pop('mode', None)
         self.write("THERMO:MODE "+mode)
      
     def getCJTemperature(self):
@@ -362,38 +615,98 @@ class Thermocouple_api():
         None.
         
         """
-        encoded_data = (raw_data + endMarker).encode()
-        self.serial.write(encoded_data) 
-    
+        self._write_bytes(raw_data.encode() + _END_MARKER_B)
+
+    def _write_bytes(self, encoded_data):
+        """
+        Sends pre-encoded bytes, going straight to the file descriptor on
+        POSIX to skip pyserial's per-call lock.
+        """
+        if self._fd == None:
+            self.serial.write(encoded_data)
+            return
+
+        # pyserial opens the descriptor non-blocking, so os.write can
+        # short-write or raise when the tx buffer is full; loop until the
+        # whole command is out so we never truncate one on the wire.
+        sent = 0
+        while sent < len(encoded_data):
+            try:
+                sent += _os.write(self._fd, encoded_data[sent:])
+            except BlockingIOError:
+                _time.sleep(0.001)
+
+
+    def _read_raw(self):
+        """
+        Reads one terminated reply from the serial line and returns the
+        payload as bytes, or None on timeout.
+        """
+        end      = _TERMINATOR_B
+        buf      = self._rx_buf
+        deadline = _time.time() + (self.serial.timeout or 1)
+
+        try:
+            # Pull everything the OS already buffered in one read();
+            # read_until() fetches the reply a byte at a time. When data is
+            # already waiting and we have a raw descriptor, drain it with a
+            # lock-free os.read; otherwise let pyserial handle the blocking
+            # wait (and the Windows case). The deadline bounds the whole
+            # reply, not each chunk, so a babbling line can't hang us.
+            while buf.find(end) < 0:
+                n_avail = self.serial.in_waiting
+                if not self._fd == None and n_avail:
+                    chunk = _os.read(self._fd, n_avail)
+                else:
+                    chunk = self.serial.read(n_avail or 1)
+
+                # Bank whatever arrived before judging the deadline, so a
+                # chunk that lands late stays buffered for the next read
+                # instead of being dropped.
+                if chunk: buf += chunk
+                if _time.time() > deadline and buf.find(end) < 0:
+                    print("ERROR: Timeout")
+                    return None
+        except:
+            print("ERROR: Timeout")
+            return None
+
+        # Consume exactly one reply; bytes that arrived after the
+        # terminator stay buffered for the next read.
+        idx     = buf.find(end)
+        payload = bytes(buf[:idx])
+        del buf[:idx+len(end)]
+        return payload
+
     def read(self):
         """
         Reads data from the serial line.
-        
+
         Returns
         -------
         str
-            Raw data string read from the serial line.
+            Raw data string read from the serial line, or '' on timeout
+            (same as read_until() used to give us, so callers that slice
+            or compare the reply keep working on a dead port).
         """
+        payload = self._read_raw()
+        if payload == None: return ''
+
         try:
-            s = self.serial.read_until(expected = terminator.encode()).decode()
-        except:
-            print("ERROR: Timeout")
-            return _n.nan
-        
-        try:
-            return s.strip(terminator)
+            return payload.decode()
         except:
-            print("ERROR: Bad format "+repr(s))
-            return _n.nan
+            print("ERROR: Bad format "+repr(payload))
+            return ''
             
             
     def disconnect(self):
         """
         Disconnects the port.
         """
-        if not self.simulation_mode and self.serial != None: 
+        if not self.simulation_mode and self.serial != None:
             self.serial.close()
             self.serial = None
+            self._fd    = None
             
             
 class Hall_interface(_g.BaseObject):
@@ -419,6 +732,9 @@ class Hall_interface(_g.BaseObject):
         self.keithley_api = None
         self.arduino_api = None
 
+        # No dump file open yet
+        self._dump_file = None
+
         # Internal parameters
         self._pyvisa_py = pyvisa_py
 
@@ -457,6 +773,9 @@ class Hall_interface(_g.BaseObject):
         
         # Button for enabling acquistion on selected dmm channels/Arduino functions
         self.button_acquire = self.grid_top.place_object(_g.Button('Acquire',True).disable(), column=10, alignment=1)
+
+        # Button to (re)scan for VISA resources and COM ports
+        self.button_rescan = self.grid_top.place_object(_g.Button('Rescan'), column=9, alignment=1)
         
         # Settings window (will display relevant DMM/Arduino information)
         self.settings  = self.grid_bot.place_object(_g.TreeDictionary()).set_width(250)
@@ -483,30 +802,16 @@ class Hall_interface(_g.BaseObject):
             else:         self.resource_manager = _mp._visa.ResourceManager()
         else: self.resource_manager = None
 
-        # Populate the list.
+        # Don't probe the hardware while building the window; enumerating
+        # VISA resources and COM ports can take seconds on Windows. The
+        # device lists start with 'Simulation' only and are filled in by
+        # the Rescan button (see _button_rescan_clicked).
         names = []
-        if self.resource_manager:
-            for x in self.resource_manager.list_resources():
-                if self.resource_manager.resource_info(x).alias:
-                    names.append(str(self.resource_manager.resource_info(x).alias))
-                else:
-                    names.append(x)
-        
-        # Grab availible comports
-        comports = _mp._serial.tools.list_ports.comports()
-        ports    = []
-        d_index  = 0
-                    
-        for i, comport in enumerate(sorted(comports)):
-            port,desc,hwid = comport
-            ports.append("{}: {}".format(port, desc))
-            
-            # Check for Arduino label in the port name
-            if 'Arduino' in desc: d_index = i
-        
+        ports = []
+
 
         # Keithley settings
-        self.settings.add_parameter('Keithley/Device', default_list_index=3,type='list', values=['Simulation']+names)
+        self.settings.add_parameter('Keithley/Device', type='list', values=['Simulation']+names)
         self.settings.add_parameter('Keithley/ID' , value='-', readonly = True)
         self.settings.add_parameter('Keithley/Status' , value = 'Not Connected', readonly = True)
         self.settings.add_parameter('Keithley/Configuration', value = ' ',readonly=True)
@@ -524,7 +829,7 @@ class Hall_interface(_g.BaseObject):
 
         
         # Arduino settings
-        self.settings.add_parameter('Arduino/Port', default_list_index=d_index+1, type='list', values=['Simulation']+ports)
+        self.settings.add_parameter('Arduino/Port', type='list', values=['Simulation']+ports)
         self.settings.add_parameter('Arduino/Firmware' , value='-', readonly = True)
         self.settings.add_parameter('Arduino/Status' , value = 'Not Connected', readonly = True)
         self.settings.add_parameter('Arduino/', value = ' ',readonly=True)
@@ -536,6 +841,7 @@ class Hall_interface(_g.BaseObject):
         self.button_keithley_connect.signal_clicked.connect(self._button_keithley_connect_clicked)
         self.button_arduino_connect.signal_clicked .connect(self._button_arduino_connect_clicked)
         self.button_acquire.signal_clicked.connect(self._button_acquire_clicked)
+        self.button_rescan.signal_clicked .connect(self._button_rescan_clicked)
 
         # Run the base object stuff and autoload settings
         _g.BaseObject.__init__(self, autosettings_path=autosettings_path)
@@ -548,6 +854,26 @@ class Hall_interface(_g.BaseObject):
         # Show the window.
         self.window.show(block)
 
+    def _button_rescan_clicked(self, *a):
+        """
+        Re-probes the available VISA resources and COM ports and refills the
+        device lists. Kept out of __init__ so building the window never
+        blocks on slow hardware enumeration.
+        """
+        global _comport_cache
+        _visa_name_cache.clear()
+        _comport_cache = None
+
+        # VISA resources
+        if self.resource_manager:
+            names = _list_visa_names(self.resource_manager)
+            self.settings.get_param('Keithley/Device').setLimits(['Simulation']+names)
+
+        # COM ports; preselect the Arduino if the scan spotted one
+        ports, d_index = _list_comports()
+        self.settings.get_param('Arduino/Port').setLimits(['Simulation']+ports)
+        if len(ports): self.settings['Arduino/Port'] = ports[d_index]
+
     def _button_keithley_connect_clicked(self, *a):
         """
         Connects or disconnects the VISA resource.
@@ -638,7 +964,7 @@ class Hall_interface(_g.BaseObject):
         """
         Get the enabled curves, storing them in plot_raw.
         """
-        _debug('_button_acquire_clicked()')
+        if _debug_enabled: _debug('_button_acquire_clicked()')
 
         # Don't double-loop!
         if not self.button_acquire.is_checked(): return
@@ -657,7 +983,7 @@ class Hall_interface(_g.BaseObject):
         # Update the label
         self.label_path.set_text('Output Path: ' + self.path)
 
-        _debug('  path='+repr(self.path))
+        if _debug_enabled: _debug('  path='+repr(self.path))
 
         # Disable the connection button
         self._set_acquisition_mode(True)
@@ -671,17 +997,37 @@ class Hall_interface(_g.BaseObject):
         d = self.plot_raw
         e = self.plot_temp
 
+        # Precompute the column keys and the enabled-channel list once per
+        # acquisition. The buttons are disabled for the duration of the run,
+        # so the enabled set cannot change under us, and this keeps the hot
+        # loop from rebuilding the same little strings every sample.
+        self._tkeys   = ['t%d' % (n+1) for n in range(8)]
+        self._vkeys   = ['v%d' % (n+1) for n in range(8)]
+        self._enabled = [n for n, b in enumerate(self.buttons) if b.is_checked()]
+
+        # Same deal for the thermocouple toggle: read it once instead of
+        # asking the widget again at every use below (and once per loop).
+        therm = self.buttonT.is_checked()
+
         # Set up the databox columns
-        _debug('  setting up databox')
+        if _debug_enabled: _debug('  setting up databox')
         d.clear()
         e.clear()
+
+        for n in self._enabled:
+            d[self._tkeys[n]] = []
+            d[self._vkeys[n]] = []
+
+        # Contiguous 2D sample buffer for the Keithley channels: one row per
+        # sweep with the (t, v) pairs side by side. Preallocated and grown
+        # geometrically, so storing a sample is O(1) and the plotter reads
+        # one contiguous slice per column instead of chasing separate
+        # ever-reallocated arrays. The thermocouple columns stay as lists
+        # because its producer thread samples at its own rate.
+        self._buf   = _n.empty((4096, 2*len(self._enabled)))
+        self._n_buf = 0
         
-        for n in range(len(self.buttons)):
-            if self.buttons[n].is_checked():
-                d['t'+str(n+1)] = []
-                d['v'+str(n+1)] = []
-        
-        if self.buttonT.is_checked():
+        if therm:
             d['t9'] = []
             d['T']  = []
             
@@ -689,94 +1035,275 @@ class Hall_interface(_g.BaseObject):
             e['T']  = []
 
 
+        # One precomputed format string turns a whole data row into a line;
+        # header rows (strings) fall back to str joining in the writer.
+        ncols = 2*len(self._enabled) + (2 if therm else 0)
+        self._row_fmt = ','.join(['%.9g']*ncols) + '\n'
+
+        # Open the output file once for the whole acquisition; opening and
+        # closing it per row costs a syscall pair per sample.
+        self._dump_file = open(self.path, 'w', buffering=1<<16)
+
+        # Writer thread: row formatting and file writes happen off the
+        # acquisition thread, fed through a lock-free queue.
+        self._write_q = _queue.SimpleQueue()
+        self._writer_thread = _threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer_thread.start()
+
         # Reset the clock and record it as header
         self._t0 =  _time.time()
+        if not self.arduino_api == None: self.arduino_api._t0 = self._t0
         try:
             self.keithley_api._t0 = self._t0
-            self._dump(['Date:', _time.ctime()], 'w')
+            self._dump(['Date:', _time.ctime()])
             self._dump(['Time:', self.keithley_api._t0])
         except:
-            self._dump(['Date:', _time.ctime()], 'w')
+            self._dump(['Date:', _time.ctime()])
             self._dump(['Time:', self._t0])
 
         # And the column labels!
         self._dump(self.plot_raw.ckeys)
 
-        # Loop until the user quits
-        _debug('  starting the loop')
-        while self.button_acquire.is_checked():
+        # Spawn the thermocouple producer thread so its serial round-trip
+        # overlaps the Keithley channel sweep instead of adding to it.
+        self._therm_queue  = _queue.SimpleQueue()
+        self._therm_thread = None
+        if therm and not self.arduino_api == None:
+            self._therm_thread = _threading.Thread(target=self._therm_worker, daemon=True)
+            self._therm_thread.start()
+
+        # Bind the hot-path callables and containers to locals; every
+        # attribute access inside the loop costs dict probes at the sample
+        # rate, and none of these can change during a run.
+        acquiring      = self.button_acquire.is_checked
+        process_events = self.window.process_events
+        draw_raw       = self.plot_raw.plot
+        draw_temp      = self.plot_temp.plot
+        settings       = self.settings
+        dump           = self._dump
+        therm_q        = self._therm_queue
+        enabled        = self._enabled
+        tkeys, vkeys   = self._tkeys, self._vkeys
+        ch_paths       = ['Keithley/Channel/%d'%(n+1) for n in enabled]
+        now            = _time.monotonic
+        buf            = self._buf
+        if not self.keithley_api == None:
+            get_voltage  = self.keithley_api.get_voltage
+            get_voltages = self.keithley_api.get_voltages
+
+        # With two or more channels enabled, one scanner pass replaces a
+        # VISA round-trip per channel.
+        chans    = [n+1 for n in enabled]
+        use_scan = len(chans) > 1
+
+        def refresh_channel_views():
+            """
+            Points the databox columns at zero-copy views into the sample
+            buffer so the plotter sees everything written so far.
+            """
+            for i, n in enumerate(enabled):
+                d[tkeys[n]] = buf[:self._n_buf, 2*i  ]
+                d[vkeys[n]] = buf[:self._n_buf, 2*i+1]
+
+        # Last values pushed into the settings tree; unchanged values are
+        # not re-written, since every write fires Qt model signals and a
+        # tree repaint (see the dirty checks in the loop).
+        last_ch = [None]*len(enabled)
+        last_T  = None
+
+        # The thermocouple samples accumulate in plain lists (their thread
+        # runs at its own rate); hand the plotter a contiguous array copy
+        # only when we actually redraw.
+        therm_t = []
+        therm_T = []
+        def refresh_therm_views():
+            if not therm: return
+            d['t9'] = e['t'] = _n.asarray(therm_t)
+            d['T']  = e['T'] = _n.asarray(therm_T)
 
-            # Next line of data
-            data = []
+        try:
+            # Loop until the user quits
+            if _debug_enabled: _debug('  starting the loop')
+            next_draw = now()
+            while acquiring():
 
-            # Get all the voltages we're supposed to
-            for n in range(len(self.buttons)):
+                # Next line of data
+                data = []
 
-                # If the button is enabled, get the time and voltage
-                if self.buttons[n].is_checked():
+                # Grow the sample buffer geometrically when it fills up
+                if self._n_buf == len(buf):
+                    buf = self._buf = _n.resize(buf, (2*len(buf), buf.shape[1]))
+                row = buf[self._n_buf]
 
-                    _debug('    getting the voltage')
+                # Get all the voltages we're supposed to
+                if use_scan:
 
-                    # Get the time and voltage, updating the window in between commands
-                    t, v = self.keithley_api.get_voltage(n+1, self.window.process_events)
-                    
-                    self.settings['Keithley/Channel/%d'%(n+1)] = v
+                    if _debug_enabled: _debug('    scanning the channels')
 
+                    # One scanner pass covers the whole sweep
+                    t, values = get_voltages(chans, process_events)
 
-                    # Append the new data points
-                    d['t'+str(n+1)] = _n.append(d['t'+str(n+1)], t)
-                    d['v'+str(n+1)] = _n.append(d['v'+str(n+1)], v)
+                    for i, n in enumerate(enabled):
+                        v = values[i]
 
-                    # Update the plot
-                    self.plot_raw.plot()
-                    self.window.process_events()
+                        # Only touch the settings tree if the value moved
+                        if last_ch[i] == None or not abs(v - last_ch[i]) <= 1e-9:
+                            settings[ch_paths[i]] = v
+                            last_ch[i] = v
 
-                    # Append this to the list
-                    data = data + [t,v]
-            
-            if self.buttonT.is_checked():        
-                t, T = _time.time()-self.keithley_api._t0, self.arduino_api.getTemperature()    
-                
-                self.settings['Arduino/Thermocouple/Temperature'] = T
-                        
-                d['t9'] = _n.append(d['t9'],t)
-                d['T']  = _n.append(d['T'] ,T)
-                
-                e['t']  = _n.append(e['t'],t)
-                e['T']  = _n.append(e['T'] ,T)
-                
-                data = data + [t,T]
-            
-            self.plot_raw .plot()
-            self.plot_temp.plot() 
-            self.window.process_events()
+                        # Store the new data points in the contiguous buffer
+                        row[2*i  ] = t
+                        row[2*i+1] = v
 
-            # Write the line to the dump file
-            self._dump(data)
+                        # Append this to the list
+                        data = data + [t,v]
 
-        _debug('  Loop complete!')
+                else:
+                    for i, n in enumerate(enabled):
+
+                        if _debug_enabled: _debug('    getting the voltage')
+
+                        # Get the time and voltage, updating the window in between commands
+                        t, v = get_voltage(n+1, process_events)
+
+                        # Only touch the settings tree if the value moved
+                        if last_ch[i] == None or not abs(v - last_ch[i]) <= 1e-9:
+                            settings[ch_paths[i]] = v
+                            last_ch[i] = v
+
+                        # Store the new data points in the contiguous buffer
+                        row[2*i  ] = t
+                        row[2*i+1] = v
+
+                        # Keep the GUI alive; redrawing happens once per
+                        # row, after the sweep
+                        process_events()
+
+                        # Append this to the list
+                        data = data + [t,v]
+
+                # The row is complete; make it visible to the plot views
+                self._n_buf += 1
+
+                if therm:
+
+                    t = T = None
+
+                    # With no Keithley channels enabled nothing above blocks,
+                    # so wait (bounded, to keep the stop button responsive)
+                    # for the next sample here; otherwise the loop spins flat
+                    # out writing empty rows.
+                    if not enabled:
+                        try:
+                            t, T = therm_q.get(timeout=0.2)
+                            therm_t.append(t)
+                            therm_T.append(T)
+                        except _queue.Empty: pass
+
+                    # Drain whatever else the thermocouple thread produced
+                    # while the Keithley sweep was running (non-blocking).
+                    try:
+                        while True:
+                            t, T = therm_q.get_nowait()
+
+                            therm_t.append(t)
+                            therm_T.append(T)
+                    except _queue.Empty: pass
+
+                    # Record the most recent sample (if any arrived this sweep)
+                    if not T == None:
+                        # Fault strings always get shown and never get cached,
+                        # so the subtraction below only ever sees numbers.
+                        if isinstance(T, str):
+                            settings['Arduino/Thermocouple/Temperature'] = T
+                        elif last_T == None or not abs(T - last_T) <= 0.01:
+                            settings['Arduino/Thermocouple/Temperature'] = T
+                            last_T = T
+                        data = data + [t,T]
+
+                    # Pad the row only when there are Keithley columns to
+                    # line up with; a therm-only sweep that produced nothing
+                    # leaves data empty so no row gets written below.
+                    elif enabled:
+                        data = data + [_n.nan,_n.nan]
+
+                if now() >= next_draw:
+                    refresh_channel_views()
+                    refresh_therm_views()
+                    draw_raw()
+                    draw_temp()
+                    next_draw = now() + _PLOT_INTERVAL
+                process_events()
+
+                # Write the line to the dump file
+                if data: dump(data)
+
+            if _debug_enabled: _debug('  Loop complete!')
+
+        # Even if something in the loop throws, stop the helper threads and
+        # make sure everything queued so far lands in the file.
+        finally:
+            self.button_acquire.set_checked(False)
+
+            # Wait for the thermocouple thread to notice the button state
+            if not self._therm_thread == None:
+                self._therm_thread.join(timeout=2)
+                self._therm_thread = None
+
+            # Shut down the writer thread and close the dump file
+            self._write_q.put(None)
+            self._writer_thread.join(timeout=5)
+            if not self._dump_file == None:
+                self._dump_file.close()
+                self._dump_file = None
+
+            # Re-enable the connect buttons
+            self._set_acquisition_mode(False)
+
+
+        # Final forced redraw so the last samples are visible
+        refresh_channel_views()
+        refresh_therm_views()
+        self.plot_raw .plot()
+        self.plot_temp.plot()
+        self.window.process_events()
 
         # Unlock the front panel if we're supposed to
         if self.settings['Keithley/Unlock']: self.keithley_api.unlock()
 
-        # Re-enable the connect button
-        self._set_acquisition_mode(False)
-
-    def _dump(self, a, mode='a'):
+    def _therm_worker(self):
         """
-        Opens self.path, writes the list a, closes self.path. mode is the file
-        open mode.
+        Background producer: reads the thermocouple on its own serial link
+        and pushes (t, T) samples into self._therm_queue for the acquisition
+        loop to drain. Runs until the Acquire button is unchecked.
         """
-        _debug('_dump('+str(a)+', '+ repr(mode)+')')
+        if _debug_enabled: _debug('_therm_worker() started')
+        while self.button_acquire.is_checked():
+            self._therm_queue.put(self.arduino_api.getTemperature())
+        if _debug_enabled: _debug('_therm_worker() done')
 
-        # Make sure everything is a string
-        for n in range(len(a)): a[n] = str(a[n])
-        self.a = a
-        
-        # Write it.
-        f = open(self.path, mode)
-        f.write(','.join(a)+'\n')
-        f.close()
+    def _writer_loop(self):
+        """
+        Consumer thread for CSV rows: pops tuples off self._write_q,
+        formats them, and writes them to the open dump file. A None
+        sentinel shuts it down.
+        """
+        if _debug_enabled: _debug('_writer_loop() started')
+        while True:
+            a = self._write_q.get()
+            if a == None: break
+            try:    line = self._row_fmt % a
+            except: line = ','.join(map(str, a))+'\n'
+            self._dump_file.write(line)
+        if _debug_enabled: _debug('_writer_loop() done')
+
+    def _dump(self, a):
+        """
+        Queues the list a to be written as one comma-separated row by the
+        writer thread.
+        """
+        if _debug_enabled: _debug('_dump('+str(a)+')')
+        self._write_q.put(tuple(a))
         
     def update_keithley_settings(self):
         
@@ -793,42 +1320,25 @@ class Hall_interface(_g.BaseObject):
             return
         
         
-        mstatus = self.keithley_api.machine_status()
+        ms = _parse_mstatus(self.keithley_api.machine_status())
 
-        ID = mstatus[:3]      # DMM ID
-        M  = mstatus[3]       # DMM Multiplex
-        F  = int(mstatus[5])  # DMM Function
-        R  = int(mstatus[21]) # DMM Range
-        S  = int(mstatus[22]) # DMM Rate
-        
         self.settings['Keithley/Status'] = 'Connected'
-        self.settings['Keithley/ID']     = ID
-        
-        if(M): self.settings['Keithley/Configuration/Multiplex'] = 'ENABLED'
-        else:  self.settings['Keithley/Configuration/Multiplex'] = 'DISABLED'
-       
-        if  (F == 0): self.settings['Keithley/Configuration/Function'] = 'DC VOLTS'
-        elif(F == 1): self.settings['Keithley/Configuration/Function'] = 'AC VOLTS'
-        elif(F == 2): self.settings['Keithley/Configuration/Function'] = 'OHMS'
-        elif(F == 3): self.settings['Keithley/Configuration/Function'] = 'DC CURRENT'
-        elif(F == 4): self.settings['Keithley/Configuration/Function'] = 'AC CURRENT'
-        elif(F == 5): self.settings['Keithley/Configuration/Function'] = 'ACV dB'
-        elif(F == 6): self.settings['Keithley/Configuration/Function'] = 'ACA dB'
-        
-        if(F == 0):
-            if  (R == 0): self.settings['Keithley/Configuration/Range'] = 'AUTO'
-            elif(R == 1): self.settings['Keithley/Configuration/Range'] = '300 mV'
-            elif(R == 2): self.settings['Keithley/Configuration/Range'] = '3 V'
-            elif(R == 3): self.settings['Keithley/Configuration/Range'] = '30 V'
-            elif(R == 4): self.settings['Keithley/Configuration/Range'] = '300V'
-            elif(R == 5): self.settings['Keithley/Configuration/Range'] = '300V'
-            elif(R == 6): self.settings['Keithley/Configuration/Range'] = '300V'
-            elif(R == 7): self.settings['Keithley/Configuration/Range'] = '300V'
+        self.settings['Keithley/ID']     = ms.ID
+
+        if(ms.M): self.settings['Keithley/Configuration/Multiplex'] = 'ENABLED'
+        else:     self.settings['Keithley/Configuration/Multiplex'] = 'DISABLED'
+
+        if(ms.F < len(_FUNC_MAP)):
+            self.settings['Keithley/Configuration/Function'] = _FUNC_MAP[ms.F]
+
+        if(ms.F == 0):
+            if(ms.R < len(_RANGE_MAP)):
+                self.settings['Keithley/Configuration/Range'] = _RANGE_MAP[ms.R]
         else:
             self.settings['Keithley/Configuration/Range'] = '-'
-        
-        if (S == 0): self.settings['Keithley/Configuration/Rate'] = '4 1/2 Digits'
-        if (S == 1): self.settings['Keithley/Configuration/Rate'] = '5 1/2 Digits'    
+
+        if(ms.S < len(_RATE_MAP)):
+            self.settings['Keithley/Configuration/Rate'] = _RATE_MAP[ms.S]
     
     def update_arduino_settings(self):
         
@@ -848,7 +1358,7 @@ class Hall_interface(_g.BaseObject):
         """
         Enables / disables the appropriate buttons, depending on the mode.
         """
-        _debug('_set_acquisition_mode('+repr(mode)+')')
+        if _debug_enabled: _debug('_set_acquisition_mode('+repr(mode)+')')
         
         self.button_keithley_connect.disable(mode)
         for b in self.buttons: b.disable(mode)